@@ -0,0 +1,18 @@
+"""
+Celery app for alx_backend_security project.
+
+Reads CELERY_* settings (including CELERY_BEAT_SCHEDULE) from Django settings
+and discovers tasks in installed apps. Run with:
+
+    celery -A alx_backend_security worker --beat
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'alx_backend_security.settings')
+
+app = Celery('alx_backend_security')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
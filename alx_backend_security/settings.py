@@ -93,6 +93,17 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 
+CELERY_BEAT_SCHEDULE = {
+    'refresh-country-stats': {
+        'task': 'ip_tracking.tasks.refresh_country_stats',
+        'schedule': 300.0,  # every 5 minutes
+    },
+    'cleanup-expired-blocks': {
+        'task': 'ip_tracking.tasks.cleanup_expired_blocks',
+        'schedule': 3600.0,  # hourly
+    },
+}
+
 # For testing without Redis:
 # CELERY_TASK_ALWAYS_EAGER = True
 ROOT_URLCONF = 'alx_backend_security.urls'
@@ -4,12 +4,22 @@ Django admin interface for managing IP tracking and blocking
 
 UPDATE: Add BlockedIP admin to your existing admin.py
 """
+from functools import lru_cache
 from django.contrib import admin
+from django.db.models import BooleanField, Case, Count, OuterRef, Subquery, Value, When
+from django.db.models.functions import Now
+from django.urls import reverse
 from .models import RequestLog, BlockedIP, BlockedAttempt
 from django.utils.html import format_html
 from django.utils import timezone
 
 
+@lru_cache(maxsize=1)
+def _blockedip_change_url_template():
+    """Resolve the BlockedIP change URL once; callers substitute the pk"""
+    return reverse('admin:ip_tracking_blockedip_change', args=['__pk__'])
+
+
 @admin.register(RequestLog)
 class RequestLogAdmin(admin.ModelAdmin):
     """Admin interface for request logs (from Task 0)"""
@@ -19,6 +29,11 @@ class RequestLogAdmin(admin.ModelAdmin):
     readonly_fields = ['ip_address', 'path', 'timestamp']
     ordering = ['-timestamp']
     list_per_page = 50
+    
+    def get_queryset(self, request):
+        """Only load the columns the changelist needs"""
+        qs = super().get_queryset(request)
+        return qs.only('ip_address', 'path', 'timestamp', 'country')
 
 
 @admin.register(BlockedIP)
@@ -83,11 +98,44 @@ class BlockedIPAdmin(admin.ModelAdmin):
         'remove_blocks'
     ]
     
+    def get_queryset(self, request):
+        """Annotate attempt counts and expiry so rows render without extra work"""
+        qs = super().get_queryset(request)
+        return qs.only(
+            'ip_address', 'reason', 'blocked_at', 'expires_at', 'blocked_by'
+        ).annotate(
+            _attempt_count=Count('attempts'),
+            _is_expired=Case(
+                When(expires_at__isnull=True, then=Value(False)),
+                When(expires_at__gt=Now(), then=Value(False)),
+                default=Value(True),
+                output_field=BooleanField()
+            )
+        )
+    
+    # Keep the is_blocked cache in sync with admin edits
+    
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        BlockedIP.clear_cache(obj.ip_address)
+        if change and form.initial.get('ip_address'):
+            # The IP itself may have been edited; drop the old key too
+            BlockedIP.clear_cache(form.initial['ip_address'])
+    
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        BlockedIP.clear_cache(obj.ip_address)
+    
+    def delete_queryset(self, request, queryset):
+        ip_addresses = list(queryset.values_list('ip_address', flat=True))
+        super().delete_queryset(request, queryset)
+        BlockedIP.clear_cache(*ip_addresses)
+    
     # Custom methods for display
     
     def ip_address_colored(self, obj):
         """Display IP with color coding based on status"""
-        if obj.is_expired():
+        if obj._is_expired:
             # Expired blocks in gray
             color = '#999'
             icon = '⏱'
@@ -117,7 +165,7 @@ class BlockedIPAdmin(admin.ModelAdmin):
                 '<span style="color: #d32f2f; font-weight: bold;">Permanent</span>'
             )
         
-        if obj.is_expired():
+        if obj._is_expired:
             return format_html(
                 '<span style="color: #999;">Expired</span>'
             )
@@ -135,7 +183,7 @@ class BlockedIPAdmin(admin.ModelAdmin):
     
     def status_badge(self, obj):
         """Visual badge for block status"""
-        if obj.is_expired():
+        if obj._is_expired:
             return format_html(
                 '<span style="background: #e0e0e0; color: #666; '
                 'padding: 3px 8px; border-radius: 3px;">EXPIRED</span>'
@@ -149,7 +197,7 @@ class BlockedIPAdmin(admin.ModelAdmin):
     
     def attempt_count(self, obj):
         """Count how many times this IP tried to access while blocked"""
-        count = obj.attempts.count()
+        count = obj._attempt_count
         if count > 0:
             return format_html(
                 '<span style="color: #d32f2f; font-weight: bold;">{} attempts</span>',
@@ -157,12 +205,14 @@ class BlockedIPAdmin(admin.ModelAdmin):
             )
         return '-'
     attempt_count.short_description = 'Blocked Attempts'
+    attempt_count.admin_order_field = '_attempt_count'
     
     # Bulk actions
     
     def make_permanent(self, request, queryset):
         """Make selected blocks permanent"""
         count = queryset.update(expires_at=None)
+        BlockedIP.clear_cache(*queryset.values_list('ip_address', flat=True))
         self.message_user(
             request,
             f'{count} block(s) made permanent.'
@@ -180,6 +230,7 @@ class BlockedIPAdmin(admin.ModelAdmin):
             else:
                 blocked.expires_at = timezone.now() + timedelta(hours=24)
             blocked.save()
+            BlockedIP.clear_cache(blocked.ip_address)
             extended += 1
         
         self.message_user(
@@ -190,8 +241,10 @@ class BlockedIPAdmin(admin.ModelAdmin):
     
     def remove_blocks(self, request, queryset):
         """Unblock selected IPs"""
-        count = queryset.count()
+        ip_addresses = list(queryset.values_list('ip_address', flat=True))
+        count = len(ip_addresses)
         queryset.delete()
+        BlockedIP.clear_cache(*ip_addresses)
         self.message_user(
             request,
             f'Removed {count} block(s).'
@@ -199,6 +252,23 @@ class BlockedIPAdmin(admin.ModelAdmin):
     remove_blocks.short_description = 'Unblock selected IPs'
 
 
+class HotPathFilter(admin.SimpleListFilter):
+    """Filter attempts by whether the path was hit more than 5 times"""
+    title = 'repeated path'
+    parameter_name = 'is_hot'
+    
+    def lookups(self, request, model_admin):
+        return (
+            ('1', 'More than 5 attempts'),
+            ('0', '5 or fewer attempts'),
+        )
+    
+    def queryset(self, request, queryset):
+        if self.value() in ('0', '1'):
+            return queryset.filter(is_hot=self.value() == '1')
+        return queryset
+
+
 @admin.register(BlockedAttempt)
 class BlockedAttemptAdmin(admin.ModelAdmin):
     """
@@ -220,6 +290,7 @@ class BlockedAttemptAdmin(admin.ModelAdmin):
     list_filter = [
         'timestamp',
         'path',
+        HotPathFilter,
     ]
     
     search_fields = [
@@ -233,9 +304,30 @@ class BlockedAttemptAdmin(admin.ModelAdmin):
     
     list_per_page = 50
     
+    # Join the BlockedIP row instead of fetching it per attempt
+    list_select_related = ['blocked_ip']
+    
+    def get_queryset(self, request):
+        """Count attempts per (blocked IP, path) in the same query"""
+        # A correlated subquery counts every attempt, whatever the changelist filters
+        same_path_count = BlockedAttempt.objects.filter(
+            blocked_ip=OuterRef('blocked_ip'),
+            path=OuterRef('path')
+        ).values('blocked_ip').annotate(c=Count('*')).values('c')
+        
+        return super().get_queryset(request).select_related('blocked_ip').annotate(
+            _same_path_count=Subquery(same_path_count)
+        ).annotate(
+            is_hot=Case(
+                When(_same_path_count__gt=5, then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField()
+            )
+        )
+    
     def blocked_ip_link(self, obj):
         """Create clickable link to the BlockedIP entry"""
-        url = f'/admin/ip_tracking/blockedip/{obj.blocked_ip.id}/change/'
+        url = _blockedip_change_url_template().replace('__pk__', str(obj.blocked_ip_id))
         return format_html(
             '<a href="{}">{}</a>',
             url, obj.blocked_ip.ip_address
@@ -244,18 +336,14 @@ class BlockedAttemptAdmin(admin.ModelAdmin):
     
     def attempts_same_path(self, obj):
         """Count attempts to same path"""
-        count = BlockedAttempt.objects.filter(
-            blocked_ip=obj.blocked_ip,
-            path=obj.path
-        ).count()
-        
-        if count > 5:
+        if obj.is_hot:
             return format_html(
                 '<span style="color: #d32f2f; font-weight: bold;">{} times</span>',
-                count
+                obj._same_path_count
             )
-        return f'{count} times'
+        return f'{obj._same_path_count} times'
     attempts_same_path.short_description = 'Attempts to this path'
+    attempts_same_path.admin_order_field = '_same_path_count'
 
 
 # Optional: Custom admin site title
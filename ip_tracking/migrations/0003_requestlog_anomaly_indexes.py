@@ -0,0 +1,15 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ip_tracking', '0002_blockedip_blockedattempt'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='requestlog',
+            index=models.Index(fields=['timestamp', 'path', 'ip_address'], name='req_ts_path_ip'),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.8 on 2026-10-15 02:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ip_tracking', '0003_requestlog_anomaly_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SuspiciousIP',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ip_address', models.GenericIPAddressField(db_index=True)),
+                ('reason', models.TextField(help_text='Why this IP was flagged')),
+                ('flagged_at', models.DateTimeField(auto_now_add=True)),
+                ('request_count', models.IntegerField(default=0)),
+                ('is_resolved', models.BooleanField(default=False)),
+            ],
+            options={
+                'verbose_name': 'Suspicious IP',
+                'verbose_name_plural': 'Suspicious IPs',
+                'ordering': ['-flagged_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='requestlog',
+            name='city',
+            field=models.CharField(blank=True, help_text='City from IP geolocation', max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='requestlog',
+            name='country',
+            field=models.CharField(blank=True, db_index=True, help_text='Country from IP geolocation', max_length=100, null=True),
+        ),
+        migrations.AlterField(
+            model_name='blockedip',
+            name='blocked_at',
+            field=models.DateTimeField(auto_now_add=True),
+        ),
+        migrations.AlterField(
+            model_name='blockedip',
+            name='blocked_by',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='blockedip',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='blockedip',
+            name='ip_address',
+            field=models.GenericIPAddressField(db_index=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='blockedip',
+            name='reason',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddIndex(
+            model_name='requestlog',
+            index=models.Index(fields=['country', '-timestamp'], name='ip_tracking_country_5f1aa1_idx'),
+        ),
+    ]
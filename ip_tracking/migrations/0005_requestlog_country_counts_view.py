@@ -0,0 +1,42 @@
+from django.db import migrations
+
+
+CREATE_COUNTRY_COUNTS = """
+CREATE MATERIALIZED VIEW requestlog_country_counts AS
+SELECT country, COUNT(*) AS request_count
+FROM ip_tracking_requestlog
+WHERE country IS NOT NULL
+GROUP BY country
+"""
+
+CREATE_COUNTRY_COUNTS_INDEX = """
+CREATE UNIQUE INDEX requestlog_country_counts_country
+ON requestlog_country_counts (country)
+"""
+
+DROP_COUNTRY_COUNTS = "DROP MATERIALIZED VIEW IF EXISTS requestlog_country_counts"
+
+
+def create_country_counts(apps, schema_editor):
+    # Materialized views are PostgreSQL-only; other backends aggregate live
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(CREATE_COUNTRY_COUNTS)
+    schema_editor.execute(CREATE_COUNTRY_COUNTS_INDEX)
+
+
+def drop_country_counts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(DROP_COUNTRY_COUNTS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ip_tracking', '0004_geolocation_suspiciousip'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_country_counts, drop_country_counts),
+    ]
@@ -1,7 +1,16 @@
+from django.core.cache import cache
 from django.db import models
+from django.db.models import Q
 from django.utils import timezone
 
 
+# How long (seconds) an is_blocked result may be served from the cache
+BLOCKED_CACHE_TIMEOUT = 60
+
+# PostgreSQL materialized view of request counts per country (migration 0005)
+COUNTRY_COUNTS_VIEW = 'requestlog_country_counts'
+
+
 class RequestLog(models.Model):
     """Updated with geolocation fields"""
     ip_address = models.GenericIPAddressField(
@@ -44,6 +53,8 @@ class RequestLog(models.Model):
             models.Index(fields=['ip_address', '-timestamp']),
             models.Index(fields=['path', '-timestamp']),
             models.Index(fields=['country', '-timestamp']),  # NEW
+            # Covers the time-window aggregations in detect_anomalies
+            models.Index(fields=['timestamp', 'path', 'ip_address'], name='req_ts_path_ip'),
         ]
     
     def __str__(self):
@@ -74,16 +85,25 @@ class BlockedIP(models.Model):
             return False
         return timezone.now() > self.expires_at
     
+    @staticmethod
+    def cache_key(ip_address):
+        return f"blocked:{ip_address}"
+    
+    @classmethod
+    def clear_cache(cls, *ip_addresses):
+        cache.delete_many([cls.cache_key(ip) for ip in ip_addresses])
+    
     @classmethod
     def is_blocked(cls, ip_address):
-        try:
-            blocked = cls.objects.get(ip_address=ip_address)
-            if blocked.is_expired():
-                blocked.delete()
-                return False
-            return True
-        except cls.DoesNotExist:
-            return False
+        # Expired rows are purged by the cleanup_expired_blocks task.
+        # Negative results are cached too, since most IPs are not blocked.
+        return cache.get_or_set(
+            cls.cache_key(ip_address),
+            lambda: cls.objects.filter(ip_address=ip_address).filter(
+                Q(expires_at__isnull=True) | Q(expires_at__gt=timezone.now())
+            ).exists(),
+            timeout=BLOCKED_CACHE_TIMEOUT
+        )
     
     @classmethod
     def block_ip(cls, ip_address, reason="", blocked_by="", duration_hours=None):
@@ -92,21 +112,24 @@ class BlockedIP(models.Model):
         if duration_hours:
             expires_at = timezone.now() + timedelta(hours=duration_hours)
         
-        blocked, created = cls.objects.get_or_create(
+        # Existing blocks keep their reason/blocked_by unless new ones are given
+        defaults = {'expires_at': expires_at}
+        if reason:
+            defaults['reason'] = reason
+        if blocked_by:
+            defaults['blocked_by'] = blocked_by
+        
+        blocked, created = cls.objects.update_or_create(
             ip_address=ip_address,
-            defaults={
+            defaults=defaults,
+            create_defaults={
                 'reason': reason,
                 'blocked_by': blocked_by,
                 'expires_at': expires_at
             }
         )
         
-        if not created:
-            blocked.reason = reason or blocked.reason
-            blocked.blocked_by = blocked_by or blocked.blocked_by
-            blocked.expires_at = expires_at
-            blocked.save()
-        
+        cls.clear_cache(ip_address)
         return blocked
     
     @classmethod
@@ -114,6 +137,7 @@ class BlockedIP(models.Model):
         try:
             blocked = cls.objects.get(ip_address=ip_address)
             blocked.delete()
+            cls.clear_cache(ip_address)
             return True
         except cls.DoesNotExist:
             return False
@@ -1,12 +1,62 @@
 from celery import shared_task
 from django.utils import timezone
 from datetime import timedelta
-from django.db.models import Count
-from .models import RequestLog, SuspiciousIP
+from collections import defaultdict
+from django.db import connection
+from django.db.models import Count, Q
+from .models import COUNTRY_COUNTS_VIEW, RequestLog, SuspiciousIP
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+# Rows removed per DELETE in cleanup_old_logs
+CLEANUP_BATCH_SIZE = 10000
+
+
+def _last_hour_hits(since, sensitive_paths):
+    """
+    Aggregate both anomaly rules over a single scan of recent RequestLog rows.
+    Returns (kind, ip_address, path, count) tuples where kind is 'volume'
+    (>100 requests, path is None) or 'path' (>10 hits on a sensitive prefix).
+    """
+    quote = connection.ops.quote_name
+    table = quote(RequestLog._meta.db_table)
+    # timestamp is a SQL keyword, so quote every column
+    ip_col, path_col, ts_col = (
+        quote(RequestLog._meta.get_field(name).column)
+        for name in ('ip_address', 'path', 'timestamp')
+    )
+    prefix_case = " ".join(
+        f"WHEN {path_col} LIKE %s THEN %s" for _ in sensitive_paths
+    )
+    prefix_params = []
+    for path in sensitive_paths:
+        prefix_params += [f"{path}%", path]
+    
+    sql = f"""
+        WITH recent AS MATERIALIZED (
+            SELECT {ip_col} AS ip_address, CASE {prefix_case} END AS prefix
+            FROM {table}
+            WHERE {ts_col} >= %s
+        )
+        SELECT 'volume', ip_address, NULL, COUNT(*)
+        FROM recent
+        GROUP BY ip_address
+        HAVING COUNT(*) > 100
+        UNION ALL
+        SELECT 'path', ip_address, prefix, COUNT(*)
+        FROM recent
+        WHERE prefix IS NOT NULL
+        GROUP BY ip_address, prefix
+        HAVING COUNT(*) > 10
+    """
+    params = prefix_params + [connection.ops.adapt_datetimefield_value(since)]
+    
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
 
 @shared_task
 def detect_anomalies():
@@ -22,62 +72,58 @@ def detect_anomalies():
     
     one_hour_ago = timezone.now() - timedelta(hours=1)
     flagged_count = 0
+    sensitive_paths = ['/admin', '/login', '/api/auth']
     
-    # Detection Rule 1: High request volume (>100 requests/hour)
-    high_volume_ips = RequestLog.objects.filter(
-        timestamp__gte=one_hour_ago
-    ).values('ip_address').annotate(
-        count=Count('ip_address')
-    ).filter(count__gt=100)
+    # Load recent flags once instead of checking each candidate IP
+    already_flagged = set()
+    already_per_path = defaultdict(set)
+    recent_flags = SuspiciousIP.objects.filter(
+        flagged_at__gte=one_hour_ago
+    ).values_list('ip_address', 'reason')
+    
+    for ip, reason in recent_flags:
+        already_flagged.add(ip)
+        for path in sensitive_paths:
+            if path in reason:
+                already_per_path[path].add(ip)
     
-    for item in high_volume_ips:
-        ip = item['ip_address']
-        count = item['count']
-        
+    # Both rules are answered from one pass over the last hour of logs
+    high_volume_ips = []
+    suspicious_ips = []
+    for kind, ip, path, count in _last_hour_hits(one_hour_ago, sensitive_paths):
+        if kind == 'volume':
+            high_volume_ips.append((ip, count))
+        else:
+            suspicious_ips.append((ip, path, count))
+    
+    # Detection Rule 1: High request volume (>100 requests/hour)
+    new_flags = []
+    for ip, count in high_volume_ips:
         # Check if already flagged recently
-        recent_flag = SuspiciousIP.objects.filter(
-            ip_address=ip,
-            flagged_at__gte=one_hour_ago
-        ).exists()
-        
-        if not recent_flag:
-            SuspiciousIP.objects.create(
+        if ip not in already_flagged:
+            new_flags.append(SuspiciousIP(
                 ip_address=ip,
                 reason=f'High request volume: {count} requests in last hour',
                 request_count=count
-            )
-            flagged_count += 1
+            ))
             logger.warning(f"Flagged {ip} for high volume: {count} requests")
     
-    # Detection Rule 2: Sensitive path access attempts
-    sensitive_paths = ['/admin', '/login', '/api/auth']
+    SuspiciousIP.objects.bulk_create(new_flags, batch_size=500)
+    flagged_count += len(new_flags)
     
-    for path in sensitive_paths:
-        suspicious_ips = RequestLog.objects.filter(
-            timestamp__gte=one_hour_ago,
-            path__startswith=path
-        ).values('ip_address').annotate(
-            count=Count('ip_address')
-        ).filter(count__gt=10)  # More than 10 attempts to sensitive path
-        
-        for item in suspicious_ips:
-            ip = item['ip_address']
-            count = item['count']
-            
-            recent_flag = SuspiciousIP.objects.filter(
+    # Detection Rule 2: Sensitive path access attempts
+    new_flags = []
+    for ip, path, count in suspicious_ips:
+        if ip not in already_per_path[path]:
+            new_flags.append(SuspiciousIP(
                 ip_address=ip,
-                flagged_at__gte=one_hour_ago,
-                reason__contains=path
-            ).exists()
-            
-            if not recent_flag:
-                SuspiciousIP.objects.create(
-                    ip_address=ip,
-                    reason=f'Multiple attempts to {path}: {count} times in last hour',
-                    request_count=count
-                )
-                flagged_count += 1
-                logger.warning(f"Flagged {ip} for suspicious access to {path}: {count} attempts")
+                reason=f'Multiple attempts to {path}: {count} times in last hour',
+                request_count=count
+            ))
+            logger.warning(f"Flagged {ip} for suspicious access to {path}: {count} attempts")
+    
+    SuspiciousIP.objects.bulk_create(new_flags, batch_size=500)
+    flagged_count += len(new_flags)
     
     logger.info(f"Anomaly detection complete. Flagged {flagged_count} IPs.")
     return flagged_count
@@ -90,15 +136,58 @@ def cleanup_old_logs():
     Run daily.
     """
     thirty_days_ago = timezone.now() - timedelta(days=30)
+    deleted_count = 0
     
-    deleted_count = RequestLog.objects.filter(
-        timestamp__lt=thirty_days_ago
-    ).delete()[0]
+    # Delete in short batches so writers aren't blocked behind one huge DELETE.
+    # The batch is picked in a subquery, so each one is a single statement.
+    while True:
+        batch = RequestLog.objects.filter(
+            timestamp__lt=thirty_days_ago
+        ).order_by().values('pk')[:CLEANUP_BATCH_SIZE]
+        deleted = RequestLog.objects.filter(pk__in=batch).delete()[0]
+        if not deleted:
+            break
+        deleted_count += deleted
+        time.sleep(0.1)
     
     logger.info(f"Cleaned up {deleted_count} old log entries")
     return deleted_count
 
 
+@shared_task
+def cleanup_expired_blocks():
+    """
+    Remove blocks whose expiry time has passed.
+    Run hourly.
+    """
+    from .models import BlockedIP
+    
+    deleted_count = BlockedIP.objects.filter(
+        expires_at__lt=timezone.now()
+    ).delete()[0]
+    
+    logger.info(f"Cleaned up {deleted_count} expired blocks")
+    return deleted_count
+
+
+@shared_task
+def refresh_country_stats():
+    """
+    Refresh the per-country request counts used by ip_statistics.
+    Run every 5 minutes. No-op outside PostgreSQL.
+    """
+    if connection.vendor != 'postgresql':
+        return False
+    
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"REFRESH MATERIALIZED VIEW CONCURRENTLY {connection.ops.quote_name(COUNTRY_COUNTS_VIEW)}"
+        )
+    
+    logger.info("Refreshed country request counts")
+    return True
+
+
 @shared_task
 def auto_block_suspicious_ips():
     """
@@ -108,31 +197,53 @@ def auto_block_suspicious_ips():
     from .models import BlockedIP
     
     # Find IPs flagged more than 3 times
-    suspicious_ips = SuspiciousIP.objects.filter(
+    candidates = set(SuspiciousIP.objects.filter(
         is_resolved=False
     ).values('ip_address').annotate(
         flag_count=Count('ip_address')
-    ).filter(flag_count__gte=3)
-    
-    blocked_count = 0
-    for item in suspicious_ips:
-        ip = item['ip_address']
-        
-        # Block if not already blocked
-        if not BlockedIP.is_blocked(ip):
-            BlockedIP.block_ip(
-                ip,
-                reason='Automatically blocked: Multiple suspicious activity flags',
+    ).filter(flag_count__gte=3).values_list('ip_address', flat=True))
+    
+    if not candidates:
+        logger.info("Auto-blocked 0 suspicious IPs")
+        return 0
+    
+    # IPs with an active block are left alone
+    now = timezone.now()
+    already_blocked = set(BlockedIP.objects.filter(
+        Q(expires_at__isnull=True) | Q(expires_at__gt=now),
+        ip_address__in=candidates
+    ).values_list('ip_address', flat=True))
+    
+    to_block = candidates - already_blocked
+    reason = 'Automatically blocked: Multiple suspicious activity flags'
+    expires_at = now + timedelta(hours=24)  # Temporary 24-hour block
+    
+    # Upsert so expired rows are renewed even if cleanup deletes them meanwhile
+    BlockedIP.objects.bulk_create(
+        [
+            BlockedIP(
+                ip_address=ip,
+                reason=reason,
                 blocked_by='System',
-                duration_hours=24  # Temporary 24-hour block
-            )
-            blocked_count += 1
-            logger.warning(f"Auto-blocked {ip} due to repeated suspicious activity")
-            
-            # Mark flags as resolved
-            SuspiciousIP.objects.filter(ip_address=ip, is_resolved=False).update(
-                is_resolved=True
+                blocked_at=now,
+                expires_at=expires_at
             )
+            for ip in to_block
+        ],
+        update_conflicts=True,
+        unique_fields=['ip_address'],
+        update_fields=['reason', 'blocked_by', 'blocked_at', 'expires_at']
+    )
+    BlockedIP.clear_cache(*to_block)
+    
+    # Mark flags as resolved
+    SuspiciousIP.objects.filter(ip_address__in=to_block, is_resolved=False).update(
+        is_resolved=True
+    )
+    
+    for ip in to_block:
+        logger.warning(f"Auto-blocked {ip} due to repeated suspicious activity")
     
+    blocked_count = len(to_block)
     logger.info(f"Auto-blocked {blocked_count} suspicious IPs")
-    return blocked_count
\ No newline at end of file
+    return blocked_count
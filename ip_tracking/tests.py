@@ -1,3 +1,354 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import BlockedAttempt, BlockedIP, RequestLog, SuspiciousIP
+from .tasks import auto_block_suspicious_ips, cleanup_old_logs, detect_anomalies
+
+
+# ip_tracking.middleware is referenced in settings but not part of the app
+TEST_MIDDLEWARE = [
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+]
+
+
+def log_requests(ip_address, path, count, age=None):
+    """Create count RequestLog rows, optionally backdated by age"""
+    RequestLog.objects.bulk_create(
+        [RequestLog(ip_address=ip_address, path=path) for _ in range(count)]
+    )
+    if age is not None:
+        RequestLog.objects.filter(ip_address=ip_address, path=path).update(
+            timestamp=timezone.now() - age
+        )
+
+
+class IsBlockedCacheTests(TestCase):
+    """Caching and invalidation of BlockedIP.is_blocked"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_caches_result(self):
+        self.assertFalse(BlockedIP.is_blocked('10.0.0.1'))
+        BlockedIP.objects.create(ip_address='10.0.0.1')
+
+        with self.assertNumQueries(0):
+            self.assertFalse(BlockedIP.is_blocked('10.0.0.1'))
+
+    def test_expired_block_is_not_blocked(self):
+        BlockedIP.objects.create(
+            ip_address='10.0.0.1',
+            expires_at=timezone.now() - timedelta(minutes=1)
+        )
+        self.assertFalse(BlockedIP.is_blocked('10.0.0.1'))
+
+    def test_block_and_unblock_invalidate(self):
+        self.assertFalse(BlockedIP.is_blocked('10.0.0.1'))
+        BlockedIP.block_ip('10.0.0.1')
+        self.assertTrue(BlockedIP.is_blocked('10.0.0.1'))
+        BlockedIP.unblock_ip('10.0.0.1')
+        self.assertFalse(BlockedIP.is_blocked('10.0.0.1'))
+
+
+@override_settings(MIDDLEWARE=TEST_MIDDLEWARE)
+class BlockedIPAdminTests(TestCase):
+    """Cache invalidation from the BlockedIP admin"""
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+
+    def test_changing_ip_invalidates_old_and_new(self):
+        blocked = BlockedIP.objects.create(ip_address='10.0.0.1')
+        self.assertTrue(BlockedIP.is_blocked('10.0.0.1'))
+        self.assertFalse(BlockedIP.is_blocked('10.0.0.2'))
+
+        response = self.client.post(
+            reverse('admin:ip_tracking_blockedip_change', args=[blocked.pk]),
+            {'ip_address': '10.0.0.2', 'reason': '', 'blocked_by': '', 'expires_at_0': '', 'expires_at_1': ''}
+        )
+
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(BlockedIP.is_blocked('10.0.0.1'))
+        self.assertTrue(BlockedIP.is_blocked('10.0.0.2'))
+
+    def test_remove_blocks_action_invalidates(self):
+        blocked = BlockedIP.objects.create(ip_address='10.0.0.1')
+        self.assertTrue(BlockedIP.is_blocked('10.0.0.1'))
+
+        self.client.post(reverse('admin:ip_tracking_blockedip_changelist'), {
+            'action': 'remove_blocks',
+            '_selected_action': [blocked.pk],
+        })
+
+        self.assertFalse(BlockedIP.objects.exists())
+        self.assertFalse(BlockedIP.is_blocked('10.0.0.1'))
+
+
+class CleanupOldLogsTests(TestCase):
+    """Batched deletion of logs older than 30 days"""
+
+    @mock.patch('ip_tracking.tasks.time.sleep')
+    @mock.patch('ip_tracking.tasks.CLEANUP_BATCH_SIZE', 2)
+    def test_deletes_old_logs_in_batches(self, sleep):
+        log_requests('10.0.0.1', '/', 5, age=timedelta(days=31))
+        log_requests('10.0.0.2', '/', 1)
+
+        self.assertEqual(cleanup_old_logs(), 5)
+        self.assertEqual(sleep.call_count, 3)
+        self.assertEqual(
+            list(RequestLog.objects.values_list('ip_address', flat=True)),
+            ['10.0.0.2']
+        )
+
+
+class AutoBlockSuspiciousIPsTests(TestCase):
+    """Blocking of IPs with repeated unresolved flags"""
+
+    def flag(self, ip_address, times=3):
+        for _ in range(times):
+            SuspiciousIP.objects.create(ip_address=ip_address, reason='Flagged')
+
+    def test_blocks_new_ips(self):
+        self.flag('10.0.0.1')
+        self.flag('10.0.0.2', times=2)
+
+        self.assertEqual(auto_block_suspicious_ips(), 1)
+        self.assertTrue(BlockedIP.is_blocked('10.0.0.1'))
+        self.assertFalse(BlockedIP.is_blocked('10.0.0.2'))
+        self.assertFalse(
+            SuspiciousIP.objects.filter(ip_address='10.0.0.1', is_resolved=False).exists()
+        )
+
+    def test_renews_expired_block(self):
+        self.flag('10.0.0.1')
+        old_block = BlockedIP.objects.create(
+            ip_address='10.0.0.1',
+            reason='Old block',
+            expires_at=timezone.now() - timedelta(hours=1)
+        )
+        BlockedIP.objects.filter(pk=old_block.pk).update(
+            blocked_at=timezone.now() - timedelta(days=2)
+        )
+
+        self.assertEqual(auto_block_suspicious_ips(), 1)
+        blocked = BlockedIP.objects.get(ip_address='10.0.0.1')
+        self.assertFalse(blocked.is_expired())
+        self.assertGreater(blocked.blocked_at, timezone.now() - timedelta(minutes=1))
+        self.assertEqual(blocked.blocked_by, 'System')
+        self.assertIn('Automatically blocked', blocked.reason)
+
+    def test_leaves_active_block_alone(self):
+        self.flag('10.0.0.1')
+        BlockedIP.objects.create(ip_address='10.0.0.1', reason='Manual block')
+
+        self.assertEqual(auto_block_suspicious_ips(), 0)
+        blocked = BlockedIP.objects.get(ip_address='10.0.0.1')
+        self.assertEqual(blocked.reason, 'Manual block')
+        self.assertIsNone(blocked.expires_at)
+        self.assertEqual(
+            SuspiciousIP.objects.filter(ip_address='10.0.0.1', is_resolved=False).count(), 3
+        )
+
+
+class BlockIPTests(TestCase):
+    """BlockedIP.block_ip create and update paths"""
+
+    def test_keeps_existing_values_when_not_given(self):
+        BlockedIP.block_ip('10.0.0.1', reason='Brute force', blocked_by='admin')
+        blocked = BlockedIP.block_ip('10.0.0.1', duration_hours=2)
+
+        self.assertEqual(BlockedIP.objects.count(), 1)
+        self.assertEqual(blocked.reason, 'Brute force')
+        self.assertEqual(blocked.blocked_by, 'admin')
+        self.assertIsNotNone(blocked.expires_at)
+
+    def test_overwrites_values_when_given(self):
+        BlockedIP.block_ip('10.0.0.1', reason='Brute force', duration_hours=2)
+        BlockedIP.block_ip('10.0.0.1', reason='Scraping', blocked_by='api')
+
+        blocked = BlockedIP.objects.get(ip_address='10.0.0.1')
+        self.assertEqual(blocked.reason, 'Scraping')
+        self.assertEqual(blocked.blocked_by, 'api')
+        self.assertIsNone(blocked.expires_at)
+
+
+class DetectAnomaliesTests(TestCase):
+    """Thresholds, time window and dedup of detect_anomalies"""
+
+    def test_high_volume_threshold(self):
+        log_requests('10.0.0.1', '/', 101)
+        log_requests('10.0.0.2', '/', 100)
+
+        self.assertEqual(detect_anomalies(), 1)
+        flag = SuspiciousIP.objects.get()
+        self.assertEqual(flag.ip_address, '10.0.0.1')
+        self.assertEqual(flag.request_count, 101)
+
+    def test_sensitive_path_threshold(self):
+        log_requests('10.0.0.1', '/admin/login/', 11)
+        log_requests('10.0.0.2', '/login', 10)
+        log_requests('10.0.0.3', '/api/authorize', 6)
+        log_requests('10.0.0.3', '/api/auth/token', 6)
+
+        self.assertEqual(detect_anomalies(), 2)
+        flags = dict(SuspiciousIP.objects.values_list('ip_address', 'request_count'))
+        self.assertEqual(flags, {'10.0.0.1': 11, '10.0.0.3': 12})
+        self.assertIn('/admin', SuspiciousIP.objects.get(ip_address='10.0.0.1').reason)
+        self.assertIn('/api/auth', SuspiciousIP.objects.get(ip_address='10.0.0.3').reason)
+
+    def test_ignores_requests_older_than_an_hour(self):
+        log_requests('10.0.0.1', '/', 60, age=timedelta(minutes=59))
+        log_requests('10.0.0.1', '/admin', 60, age=timedelta(minutes=61))
+
+        self.assertEqual(detect_anomalies(), 0)
+        self.assertFalse(SuspiciousIP.objects.exists())
+
+    def test_skips_recently_flagged_ips(self):
+        log_requests('10.0.0.1', '/', 101)
+        log_requests('10.0.0.2', '/admin', 11)
+        log_requests('10.0.0.2', '/login', 11)
+        SuspiciousIP.objects.create(ip_address='10.0.0.1', reason='Earlier flag')
+        SuspiciousIP.objects.create(
+            ip_address='10.0.0.2',
+            reason='Multiple attempts to /admin: 20 times in last hour'
+        )
+
+        self.assertEqual(detect_anomalies(), 1)
+        new_flag = SuspiciousIP.objects.latest('id')
+        self.assertEqual(new_flag.ip_address, '10.0.0.2')
+        self.assertIn('/login', new_flag.reason)
+
+    def test_flags_again_after_an_hour(self):
+        log_requests('10.0.0.1', '/', 101)
+        old_flag = SuspiciousIP.objects.create(ip_address='10.0.0.1', reason='Earlier flag')
+        SuspiciousIP.objects.filter(pk=old_flag.pk).update(
+            flagged_at=timezone.now() - timedelta(hours=2)
+        )
+
+        self.assertEqual(detect_anomalies(), 1)
+
+
+@override_settings(MIDDLEWARE=TEST_MIDDLEWARE)
+class BlockedAttemptAdminTests(TestCase):
+    """Changelist annotations and the repeated-path filter"""
+
+    def setUp(self):
+        user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+        blocked = BlockedIP.objects.create(ip_address='10.0.0.1')
+        BlockedAttempt.objects.bulk_create(
+            [BlockedAttempt(blocked_ip=blocked, path='/admin') for _ in range(6)]
+            + [BlockedAttempt(blocked_ip=blocked, path='/login') for _ in range(2)]
+        )
+        self.changelist = reverse('admin:ip_tracking_blockedattempt_changelist')
+
+    def test_hot_path_filter(self):
+        hot = self.client.get(self.changelist, {'is_hot': '1'})
+        cold = self.client.get(self.changelist, {'is_hot': '0'})
+
+        self.assertEqual(hot.context['cl'].result_count, 6)
+        self.assertEqual(cold.context['cl'].result_count, 2)
+
+    def test_same_path_count_ignores_other_filters(self):
+        old_ids = list(
+            BlockedAttempt.objects.filter(path='/admin').values_list('pk', flat=True)[:3]
+        )
+        BlockedAttempt.objects.filter(pk__in=old_ids).update(
+            timestamp=timezone.now() - timedelta(days=30)
+        )
+        since = (timezone.now() - timedelta(days=1)).date().isoformat()
+
+        response = self.client.get(self.changelist, {'timestamp__gte': since, 'is_hot': '1'})
+
+        cl = response.context['cl']
+        self.assertEqual(cl.result_count, 3)
+        self.assertEqual({attempt._same_path_count for attempt in cl.result_list}, {6})
+
+    def test_delete_selected_with_hot_path_filter(self):
+        cold_ids = list(
+            BlockedAttempt.objects.filter(path='/login').values_list('pk', flat=True)
+        )
+
+        response = self.client.post(f'{self.changelist}?is_hot=0', {
+            'action': 'delete_selected',
+            'post': 'yes',
+            '_selected_action': cold_ids,
+        })
+
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(BlockedAttempt.objects.filter(path='/login').exists())
+        self.assertEqual(BlockedAttempt.objects.count(), 6)
+
+
+@override_settings(MIDDLEWARE=TEST_MIDDLEWARE)
+class IPListAPITests(TestCase):
+    """Cursor-paginated blocked and suspicious IP list endpoints"""
+
+    def create_blocked(self, count):
+        now = timezone.now()
+        for i in range(count):
+            blocked = BlockedIP.objects.create(ip_address=f'10.0.0.{i + 1}')
+            BlockedIP.objects.filter(pk=blocked.pk).update(
+                blocked_at=now - timedelta(minutes=i)
+            )
+
+    def test_is_active(self):
+        now = timezone.now()
+        BlockedIP.objects.create(ip_address='10.0.0.1')
+        BlockedIP.objects.create(ip_address='10.0.0.2', expires_at=now - timedelta(hours=1))
+        BlockedIP.objects.create(ip_address='10.0.0.3', expires_at=now + timedelta(hours=1))
+
+        data = self.client.get(reverse('list_blocked_ips')).json()
+
+        self.assertEqual(
+            {row['ip_address']: row['is_active'] for row in data['blocked_ips']},
+            {'10.0.0.1': True, '10.0.0.2': False, '10.0.0.3': True}
+        )
+
+    def test_pages_follow_next_cursor(self):
+        self.create_blocked(5)
+
+        first = self.client.get(reverse('list_blocked_ips'), {'page_size': 2}).json()
+        second = self.client.get(first['next']).json()
+        last = self.client.get(second['next']).json()
+
+        self.assertEqual(first['count'], 5)
+        self.assertIsNone(first['previous'])
+        self.assertEqual(
+            [row['ip_address'] for row in first['blocked_ips'] + second['blocked_ips']],
+            ['10.0.0.1', '10.0.0.2', '10.0.0.3', '10.0.0.4']
+        )
+        self.assertEqual([row['ip_address'] for row in last['blocked_ips']], ['10.0.0.5'])
+        self.assertIsNone(last['next'])
+
+    def test_default_page_size(self):
+        self.create_blocked(101)
+
+        data = self.client.get(reverse('list_blocked_ips')).json()
+
+        self.assertEqual(len(data['blocked_ips']), 100)
+        self.assertEqual(data['count'], 101)
+        self.assertIsNotNone(data['next'])
+
+    def test_suspicious_ips_excludes_resolved(self):
+        SuspiciousIP.objects.create(ip_address='10.0.0.1', reason='Flagged', request_count=5)
+        SuspiciousIP.objects.create(ip_address='10.0.0.2', reason='Flagged', is_resolved=True)
+
+        data = self.client.get(reverse('list_suspicious_ips'), {'page_size': 1}).json()
+
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(data['suspicious_ips'][0]['ip_address'], '10.0.0.1')
+        self.assertEqual(data['suspicious_ips'][0]['request_count'], 5)
+        self.assertIsNone(data['next'])
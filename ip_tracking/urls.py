@@ -3,7 +3,7 @@ from django.urls import path
 from . import views
 
 urlpatterns = [
-    path('', views.home, name='home'),  # main page
-    # add other paths as needed, e.g.,
-    # path('log/', views.log_ip, name='log_ip'),
+    path('api/stats/', views.ip_statistics, name='ip_statistics'),
+    path('api/blocked/', views.list_blocked_ips, name='list_blocked_ips'),
+    path('api/suspicious/', views.list_suspicious_ips, name='list_suspicious_ips'),
 ]
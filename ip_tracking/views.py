@@ -1,11 +1,76 @@
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.pagination import CursorPagination
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
-from .models import RequestLog, BlockedIP, SuspiciousIP
-from django.db.models import Count
+from .models import COUNTRY_COUNTS_VIEW, RequestLog, BlockedIP, SuspiciousIP
+from django.db import connection
+from django.views.decorators.cache import cache_page
+from django.db.models import BooleanField, Case, Count, Value, When
+from django.db.models.functions import Now
 
+
+class IPListPagination(CursorPagination):
+    """Cursor paging for the IP list endpoints, newest first"""
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class BlockedIPPagination(IPListPagination):
+    ordering = '-blocked_at'
+
+
+class SuspiciousIPPagination(IPListPagination):
+    ordering = '-flagged_at'
+
+
+def approx_count(model):
+    """
+    Row count estimate for large tables.
+    Uses the planner statistics on PostgreSQL, exact COUNT(*) elsewhere.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                [model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        # reltuples is -1 until the table has been vacuumed/analyzed
+        if row and row[0] >= 0:
+            return row[0]
+    return model.objects.count()
+
+
+def top_countries(limit=5):
+    """
+    Countries with the most requests.
+    Reads the materialized view on PostgreSQL (refreshed by
+    refresh_country_stats), aggregates RequestLog directly elsewhere.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT country, request_count FROM {connection.ops.quote_name(COUNTRY_COUNTS_VIEW)} "
+                "ORDER BY request_count DESC LIMIT %s",
+                [limit]
+            )
+            return [
+                {'country': country, 'count': count}
+                for country, count in cursor.fetchall()
+            ]
+    
+    return list(
+        RequestLog.objects.exclude(country__isnull=True)
+        .values('country')
+        .annotate(count=Count('country'))
+        .order_by('-count')[:limit]
+    )
+
+
+@cache_page(60)
 @swagger_auto_schema(
     method='get',
     operation_description="Get statistics about IP tracking",
@@ -16,17 +81,13 @@ def ip_statistics(request):
     """
     Get IP tracking statistics
     Returns counts of logs, blocked IPs, and suspicious IPs
+    total_requests is an estimate on PostgreSQL; responses are cached for 60s
     """
     stats = {
-        'total_requests': RequestLog.objects.count(),
+        'total_requests': approx_count(RequestLog),
         'blocked_ips': BlockedIP.objects.count(),
         'suspicious_ips': SuspiciousIP.objects.filter(is_resolved=False).count(),
-        'top_countries': list(
-            RequestLog.objects.exclude(country__isnull=True)
-            .values('country')
-            .annotate(count=Count('country'))
-            .order_by('-count')[:5]
-        )
+        'top_countries': top_countries()
     }
     return Response(stats)
 
@@ -85,17 +146,28 @@ def block_ip_api(request):
 def list_blocked_ips(request):
     """
     Get list of all blocked IPs
+    Paginated with ?cursor= and ?page_size=
     """
-    blocked_ips = BlockedIP.objects.all()
-    data = [{
-        'ip_address': ip.ip_address,
-        'reason': ip.reason,
-        'blocked_at': ip.blocked_at,
-        'expires_at': ip.expires_at,
-        'is_active': not ip.is_expired()
-    } for ip in blocked_ips]
+    blocked_ips = BlockedIP.objects.annotate(
+        is_active=Case(
+            When(expires_at__isnull=True, then=Value(True)),
+            When(expires_at__gt=Now(), then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField()
+        )
+    ).values(
+        'ip_address', 'reason', 'blocked_at', 'expires_at', 'is_active'
+    ).order_by('-blocked_at')
     
-    return Response({'blocked_ips': data, 'count': len(data)})
+    paginator = BlockedIPPagination()
+    data = paginator.paginate_queryset(blocked_ips, request)
+    
+    return Response({
+        'blocked_ips': data,
+        'count': blocked_ips.count(),
+        'next': paginator.get_next_link(),
+        'previous': paginator.get_previous_link()
+    })
 
 
 @swagger_auto_schema(
@@ -107,13 +179,18 @@ def list_blocked_ips(request):
 def list_suspicious_ips(request):
     """
     Get list of suspicious IPs
+    Paginated with ?cursor= and ?page_size=
     """
-    suspicious = SuspiciousIP.objects.filter(is_resolved=False)
-    data = [{
-        'ip_address': ip.ip_address,
-        'reason': ip.reason,
-        'request_count': ip.request_count,
-        'flagged_at': ip.flagged_at
-    } for ip in suspicious]
+    suspicious = SuspiciousIP.objects.filter(is_resolved=False).values(
+        'ip_address', 'reason', 'request_count', 'flagged_at'
+    ).order_by('-flagged_at')
+    
+    paginator = SuspiciousIPPagination()
+    data = paginator.paginate_queryset(suspicious, request)
     
-    return Response({'suspicious_ips': data, 'count': len(data)})
\ No newline at end of file
+    return Response({
+        'suspicious_ips': data,
+        'count': suspicious.count(),
+        'next': paginator.get_next_link(),
+        'previous': paginator.get_previous_link()
+    })
\ No newline at end of file